@@ -5,19 +5,22 @@ from google.adk.sessions import InMemorySessionService
 from dotenv import load_dotenv
 import os
 
-from google.adk.agents import Agent, SequentialAgent, LlmAgent,Agent
-from google.adk.events import Event, EventActions
-from google.adk.agents.invocation_context import InvocationContext
-from typing import AsyncGenerator, List, Dict, Any, Optional
+from google.adk.agents import LlmAgent
 from .tools import (
     get_user_id,
     get_user_data,
     update_user_data,
     list_vendors,
     get_vendor_details,
+    get_vendor_details_many,
     add_budget_item,
+    add_budget_items_bulk,
+    get_budget_dashboard,
     get_budget_items,
+    get_budget_overview,
+    get_budget_summary,
     update_budget_item,
+    update_budget_items,
     delete_budget_item,
     search_rituals
 )
@@ -27,6 +30,26 @@ from google.genai import types
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# --- Tool Sets ---
+# Built once at import and shared by the sub-agents; the user profile tools
+# are used by both onboarding and budget.
+
+USER_PROFILE_TOOLS = (get_user_data, update_user_data)
+ONBOARDING_TOOLS = (get_user_id,) + USER_PROFILE_TOOLS
+RITUAL_TOOLS = (search_rituals,)
+BUDGET_TOOLS = (
+    add_budget_item,
+    add_budget_items_bulk,
+    get_budget_items,
+    get_budget_dashboard,
+    get_budget_overview,
+    get_budget_summary,
+    update_budget_item,
+    update_budget_items,
+    delete_budget_item,
+) + USER_PROFILE_TOOLS
+VENDOR_TOOLS = (list_vendors, get_vendor_details, get_vendor_details_many)
+
 # --- Sub-Agents ---
 
 ONBOARDING_PROMPT = (
@@ -46,7 +69,7 @@ onboarding_agent = LlmAgent(
     model="gemini-2.0-flash",
     description="Handles user onboarding.",
     instruction=ONBOARDING_PROMPT,
-    tools=[get_user_id, get_user_data, update_user_data]
+    tools=list(ONBOARDING_TOOLS)
 )
 
 RITUAL_PROMPT = (
@@ -64,7 +87,7 @@ ritual_search_agent = LlmAgent(
     model="gemini-2.0-flash",
     description="Handles ritual search.",
     instruction=RITUAL_PROMPT,
-    tools=[search_rituals]
+    tools=list(RITUAL_TOOLS)
 )
 
 BUDGET_PROMPT = (
@@ -72,6 +95,11 @@ BUDGET_PROMPT = (
     "Your job is to help set a realistic, itemized wedding budget and suggest allocations by category (venue, catering, decor, etc.). "
     "ALWAYS ask for total budget, number of events, and region if not already collected, and try to collect these in a single step if possible. "
     "Use your tools to add, get, update, and delete budget items, and to fetch user preferences. "
+    "When adding several items at once (e.g. an initial allocation), add them together with the bulk tool. "
+    "When you need both the user's preferences and their budget items, fetch them together with the overview tool. "
+    "For totals per category, use the budget summary tool instead of adding up items yourself. "
+    "When you need both the totals and the individual items, fetch them together with the dashboard tool. "
+    "When changing several items at once, apply the changes together with the batch update tool. "
     "Do NOT answer questions outside of budgeting. If asked, politely redirect to the relevant topic. "
     "When budget setup is complete, confirm all details. "
 )
@@ -81,14 +109,7 @@ budget_agent = LlmAgent(
     model="gemini-2.0-flash",
     description="Handles budget management.",
     instruction=BUDGET_PROMPT,
-    tools=[
-        add_budget_item,
-        get_budget_items,
-        update_budget_item,
-        delete_budget_item,
-        get_user_data,
-        update_user_data
-    ]
+    tools=list(BUDGET_TOOLS)
 )
 
 VENDOR_PROMPT = (
@@ -96,6 +117,8 @@ VENDOR_PROMPT = (
     "Your job is to help specify and refine preferences for wedding vendors (venue, photographer, caterer, etc.). "
     "ALWAYS ask for location, style, budget per category, and any special requirements, and try to collect these in a single step if possible. "
     "Use your tools to search and fetch vendor details. "
+    "When comparing several vendors, fetch their details together with the multi-vendor details tool. "
+    "Vendor searches return the best rated vendors one page at a time; when next_cursor is set, pass it as cursor to see more. "
     "Never answer questions outside of vendor search and preferences. If asked, politely redirect to the relevant topic. "
     "When vendor preferences are finalized, confirm all details. "
 )
@@ -105,10 +128,7 @@ vendor_search_agent = LlmAgent(
     model="gemini-2.0-flash",
     description="Handles vendor search.",
     instruction=VENDOR_PROMPT,
-    tools=[
-        list_vendors,
-        get_vendor_details
-    ]
+    tools=list(VENDOR_TOOLS)
 )
 
 # --- Root Agent ---
@@ -185,4 +205,10 @@ if __name__ == "__main__":
         # Example interactive call
         await call_agent_async("What is kanyadhanam ?", runner, USER_ID, SESSION_ID)
 
-    asyncio.run(run_agent())
+    try:
+        # uvloop's libuv-based loop cuts per-await overhead; it is POSIX-only.
+        import uvloop
+    except ImportError:
+        asyncio.run(run_agent())
+    else:
+        uvloop.run(run_agent())
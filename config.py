@@ -13,20 +13,56 @@ ASTRA_DB_APPLICATION_TOKEN = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
 # Add more as needed for Google ADK, etc.
 
 # Astra DB and Supabase connection utilities
+from functools import lru_cache
 from astrapy import DataAPIClient
 from supabase import create_client, Client
+from supabase.client import ClientOptions
 
 # Astra DB setup
 ASTRA_API_TOKEN = os.getenv("ASTRA_API_TOKEN")
 ASTRA_API_ENDPOINT = os.getenv("ASTRA_API_ENDPOINT")
 
-astra_client = DataAPIClient(ASTRA_API_TOKEN)
-astra_db = astra_client.get_database_by_api_endpoint(ASTRA_API_ENDPOINT)
-
 # Supabase setup (using correct URL and key, no DATABASE_URL needed)
 SUPABASE_URL = os.getenv("SUPABASE_URL") 
 SUPABASE_KEY = os.getenv("SUPABASE_KEY") 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Seconds before a PostgREST request is abandoned, so a stalled call cannot hold
+# an agent turn (and its pooled HTTP connection) indefinitely.
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT") or 30)
+
+# Set CACHE_ENABLED=0 to turn off the read caches in tools.py, e.g. when another
+# service writes the same tables and stale reads are not acceptable.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+# Bounds of the per-user budget read cache in tools.py: how many users it holds and
+# how many seconds an entry lives before it is re-read.
+BUDGET_CACHE_SIZE = int(os.getenv("BUDGET_CACHE_SIZE") or 10_000)
+BUDGET_CACHE_TTL = float(os.getenv("BUDGET_CACHE_TTL") or 30)
+
+# Clients are created on first use and then shared by every caller, so importing
+# this module (e.g. during test collection) does not open any connections.
+@lru_cache(maxsize=None)
+def get_astra_db():
+    """Returns the shared Astra DB database handle."""
+    astra_client = DataAPIClient(ASTRA_API_TOKEN)
+    return astra_client.get_database_by_api_endpoint(ASTRA_API_ENDPOINT)
+
+
+@lru_cache(maxsize=None)
+def get_supabase() -> Client:
+    """Returns the shared Supabase client."""
+    return create_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT),
+    )
+
+
+def __getattr__(name):
+    # Keeps `from config import supabase, astra_db` working for scripts.
+    if name == "supabase":
+        return get_supabase()
+    if name == "astra_db":
+        return get_astra_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ToolContext for ADK tools (if needed)
 # tool_context = ToolContext()  # Removed: requires invocation_context, not needed for connection setup
@@ -1,13 +1,6 @@
 # Ritual Search Agent Utility (Astra DB)
-from astrapy import DataAPIClient
 from typing import List, Dict, Any
-import os
-
-ASTRA_API_TOKEN = os.environ.get("ASTRA_API_TOKEN")
-ASTRA_API_ENDPOINT = os.environ.get("ASTRA_API_ENDPOINT")
-
-client = DataAPIClient(ASTRA_API_TOKEN)
-db = client.get_database_by_api_endpoint(ASTRA_API_ENDPOINT)
+from config import get_astra_db  # Use the shared Astra DB handle from config.py
 
 
 def search_rituals(question: str, top_k: int = 3) -> List[Dict[str, Any]]:
@@ -15,17 +8,13 @@ def search_rituals(question: str, top_k: int = 3) -> List[Dict[str, Any]]:
     Search rituals in Astra DB using vector search for a given question.
     Returns top_k most relevant documents.
     """
-    ritual_data = db.get_collection("ritual_data")
+    ritual_data = get_astra_db().get_collection("ritual_data")
     result = ritual_data.find(
         projection={"$vectorize": True},
         sort={"$vectorize": question},
+        limit=top_k,
     )
-    contexts = []
-    for doc in result:
-        if len(contexts) >= top_k:
-            break
-        contexts.append(doc)
-    return contexts
+    return list(result)
 
 # Example usage (for testing):
 if __name__ == "__main__":
@@ -20,4 +20,6 @@ async def get_tools():
         print(f"- {tool1.name}: {tool1.description}")
     # all = await tool[1].run_async(args=None, tool_context=None)
     # print(f"All tools: {all}")
-asyncio.run(get_tools())
\ No newline at end of file
+
+if __name__ == "__main__":
+    asyncio.run(get_tools())
@@ -32,10 +32,10 @@ print(f"\nTesting get_budget_items with user_id: {test_user_id}")
 print(get_budget_items(test_user_id))
 
 print(f"\nTesting update_budget_item with item_id: {test_item_id}")
-print(update_budget_item(test_item_id, amount=200.00))
+print(update_budget_item(test_user_id, test_item_id, amount=200.00))
 
 print(f"\nTesting delete_budget_item with item_id: {test_item_id}")
-print(delete_budget_item(test_item_id))
+print(delete_budget_item(test_user_id, test_item_id))
 
 print(f"\nTesting search_rituals with question: {test_question}")
 print(search_rituals(test_question))
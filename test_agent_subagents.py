@@ -1,9 +1,80 @@
 import pytest
 import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from google.genai import types
 from .agent import onboarding_agent, ritual_search_agent, budget_agent, vendor_search_agent
+from .tools import (
+    get_user_id,
+    get_user_data,
+    update_user_data,
+    list_vendors,
+    get_vendor_details,
+    add_budget_item,
+    add_budget_items_bulk,
+    get_budget_items,
+    get_budget_summary,
+    update_budget_item,
+    delete_budget_item,
+    search_rituals,
+    update_budget_items,
+    get_budget_items_many,
+    get_vendor_details_many,
+)
+from . import tools
+
+
+class _FakeQuery:
+    """Stands in for a PostgREST request builder: builder methods chain and are recorded,
+    and execute() returns whatever `respond(calls)` builds from them."""
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return method
+
+    def execute(self):
+        return SimpleNamespace(data=self.respond(self.calls))
+
+
+class _FakeSupabase:
+    def __init__(self, respond):
+        self.respond = respond
+        self.rpcs = []
+
+    def table(self, name):
+        return _FakeQuery(self.respond)
+
+    def rpc(self, name, params):
+        self.rpcs.append((name, params))
+        return _FakeQuery(self.respond)
+
+
+def _call_arg(calls, method, column):
+    return next(args[1] for name, args in calls if name == method and args[0] == column)
+
+
+_TOOL_CACHES = (
+    "_read_cache", "_read_generations", "_vendor_cache", "_vendor_generations", "_vendor_list_cache",
+    "_budget_cache", "_budget_generations", "_missing_budget_items",
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_tool_caches(monkeypatch):
+    # The caches are module globals shared by every test; give each test empty ones, and
+    # real ones even when CACHE_ENABLED=0, since several tests assert on cache contents.
+    for name in _TOOL_CACHES:
+        monkeypatch.setattr(tools, name, tools._LockedTTLCache(maxsize=4096, ttl=60))
 
 @pytest.mark.asyncio
 async def test_onboarding_agent():
@@ -56,7 +127,6 @@ async def test_vendor_search_agent():
 @pytest.mark.asyncio
 def test_onboarding_agent_tools():
     # Test the onboarding agent's tools directly
-    from .tools import get_user_id, get_user_data, update_user_data
     # Example: test get_user_id
     user_id = get_user_id("test@example.com")
     assert user_id is not None or user_id is None  # Accepts any result for demo
@@ -69,30 +139,273 @@ def test_onboarding_agent_tools():
 
 @pytest.mark.asyncio
 def test_ritual_search_agent_tools():
-    from .tools import search_rituals
     rituals = search_rituals("Tamil Brahmin")
     assert isinstance(rituals, list) or rituals is None
 
 @pytest.mark.asyncio
 def test_budget_agent_tools():
-    from .tools import add_budget_item, get_budget_items, update_budget_item, delete_budget_item
     # Add budget item
     add_result = add_budget_item("test_user", {"item": "Venue", "category": "Venue", "amount": 10000})
     assert add_result is not None or add_result is None
+    # Add several budget items in one request
+    bulk_result = add_budget_items_bulk("test_user", [
+        {"item": "Catering", "category": "Catering", "amount": 5000},
+        {"item": "Decor", "category": "Decor", "amount": 2000}
+    ])
+    assert bulk_result == {"error": "Invalid budget item: 'user_id' must be a UUID."}
+    assert add_budget_items_bulk("test_user", []) == []
     # Get budget items
     items = get_budget_items("1b006058-1133-490c-b2de-90c444e56138")
     assert isinstance(items, list) or items is None
+    # Get per-category totals
+    assert get_budget_summary("test_user") == {"error": "Invalid user_id."}
     # Update budget item
-    update_result = update_budget_item("8eb19cec-a51a-4327-80cb-3d441a9e66b7", amount=12000)
+    update_result = update_budget_item("1b006058-1133-490c-b2de-90c444e56138", "8eb19cec-a51a-4327-80cb-3d441a9e66b7", amount=12000)
     assert update_result is not None or update_result is None
     # Delete budget item
-    delete_result = delete_budget_item("8eb19cec-a51a-4327-80cb-3d441a9e66b7")
+    delete_result = delete_budget_item("1b006058-1133-490c-b2de-90c444e56138", "8eb19cec-a51a-4327-80cb-3d441a9e66b7")
     assert delete_result is not None or delete_result is None
 
 @pytest.mark.asyncio
 def test_vendor_search_agent_tools():
-    from .tools import list_vendors, get_vendor_details
-    vendors = list_vendors({"vendor_category": "Venue", "address->>city": "Bangalore"})
-    assert isinstance(vendors, list) or vendors is None
+    vendors = list_vendors({"vendor_category": "Venue", "city": "Bangalore"})
+    assert isinstance(vendors.get("data"), list), vendors
     details = get_vendor_details(1)
     assert isinstance(details, dict) or details is None
+
+
+def test_update_budget_items_concurrently(monkeypatch):
+    # Every other item "exists"; the updates run on the I/O pool and all touch the same user's caches.
+    user_id = "1b006058-1133-490c-b2de-90c444e56138"
+    item_ids = [str(uuid.uuid4()) for _ in range(32)]
+    existing = set(item_ids[::2])
+
+    def respond(calls):
+        item_id = _call_arg(calls, "eq", "item_id")
+        return [{"item_id": item_id, "amount": 1}] if item_id in existing else []
+
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(respond))
+    for _ in range(5):
+        tools._cache_budget(user_id, "items", [], tools._budget_generation(user_id))
+        results = update_budget_items(user_id, [{"item_id": i, "amount": 1} for i in item_ids])
+        assert [("error" not in r) for r in results] == [i in existing for i in item_ids]
+        assert tools._cached_budget(user_id, "items") is None
+    assert all((user_id, i) in tools._missing_budget_items for i in item_ids if i not in existing)
+
+
+def test_get_budget_items_does_not_cache_across_a_write(monkeypatch):
+    user_id = "5f2c7a4e-8d1b-4c3a-9e6f-0a1b2c3d4e5f"
+
+    def respond(calls):
+        tools._invalidate_budget(user_id)  # a write lands while the read is in flight
+        return [{"item_id": "a", "amount": 1}]
+
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(respond))
+    assert get_budget_items(user_id) == [{"item_id": "a", "amount": 1}]
+    assert tools._cached_budget(user_id, "items") is None
+
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(lambda calls: [{"item_id": "a", "amount": 1}]))
+    get_budget_items(user_id)[0]["amount"] = 99  # callers get copies, not the cached rows
+    assert get_budget_items(user_id) == [{"item_id": "a", "amount": 1}]
+
+
+def test_get_budget_items_many_normalises_and_validates_ids(monkeypatch):
+    upper = "9A8B7C6D-5E4F-4A3B-8C2D-1E0F9A8B7C6D"
+    other = "0d1e2f3a-4b5c-4d6e-8f7a-8b9c0d1e2f3a"
+
+    def respond(calls):
+        # Postgres returns the canonical lower-case spelling whatever the query used.
+        return [{"user_id": upper.lower(), "item_id": "a"}, {"user_id": other, "item_id": "b"}]
+
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(respond))
+    result = get_budget_items_many([upper, other, "not-a-uuid"])
+    assert result[upper] == [{"user_id": upper.lower(), "item_id": "a"}]
+    assert result[other] == [{"user_id": other, "item_id": "b"}]
+    assert "error" in result["not-a-uuid"]
+    assert tools._cached_budget(upper.lower(), "items") == result[upper]
+
+
+def test_get_vendor_details_refresh_evicts_missing_vendor(monkeypatch):
+    vendor_id = str(uuid.uuid4())
+    row = {"vendor_id": vendor_id, "vendor_name": "Gone"}
+    stale = (time.monotonic() - tools._VENDOR_REFRESH_AFTER - 1, row)
+    tools._vendor_cache[vendor_id] = stale
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(lambda calls: None))
+
+    assert get_vendor_details(vendor_id) == row  # the stale row is still served
+    deadline = time.monotonic() + 5
+    while vendor_id in tools._vendor_refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert vendor_id not in tools._vendor_cache
+
+
+def test_summarize_budget_items_matches_sql_summary():
+    items = [
+        {"category": "venue", "amount": 798.7, "status": "Paid"},
+        {"category": "\u00c9clairage", "amount": 0.1, "status": "Pending"},
+        {"category": "\u00c9clairage", "amount": 0.2, "status": "Paid"},
+        {"category": "Catering", "amount": "1.00", "status": "Pending"},
+    ]
+    rows = tools._summarize_budget_items(items)
+    # Codepoint order, like ORDER BY category COLLATE "C": upper-case before lower-case before accented.
+    assert [r["category"] for r in rows] == ["Catering", "venue", "\u00c9clairage"]
+    by_category = {r["category"]: r for r in rows}
+    assert by_category["\u00c9clairage"]["item_count"] == 2
+    assert by_category["\u00c9clairage"]["total"] == 0.3 and by_category["\u00c9clairage"]["total_paid"] == 0.2
+    assert all(r["budget_total"] == 800.0 and r["budget_paid"] == 798.9 for r in rows)
+    # 1 / 800 = 0.125%: the half rounds away from zero, as SQL's ROUND does (round() gives 0.12).
+    assert by_category["Catering"]["percentage_of_budget"] == 0.13
+    assert by_category["venue"]["percentage_of_budget"] == 99.84
+
+    zero = tools._summarize_budget_items([{"category": "Misc", "amount": 0, "status": "Pending"}])
+    assert zero == [{"category": "Misc", "item_count": 1, "total": 0.0, "total_paid": 0.0,
+                     "percentage_of_budget": None, "budget_total": 0.0, "budget_paid": 0.0}]
+
+
+def test_add_budget_items_bulk_and_summary_offline(monkeypatch):
+    user_id = "3c4d5e6f-7a8b-4c9d-8e0f-1a2b3c4d5e6f"
+
+    def respond(calls):
+        if calls and calls[0][0] == "insert":
+            return [dict(row, item_id=str(uuid.uuid4())) for row in calls[0][1][0]]
+        return [{"category": "Catering", "item_count": 1, "total": 5000}]
+
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(respond))
+    missing_item = add_budget_items_bulk(user_id, [{"category": "Decor", "amount": 2000}])
+    assert missing_item == {"error": "Invalid budget item: 'item' must be a non-empty string."}
+    rows = add_budget_items_bulk(user_id, [
+        {"item": "Catering", "category": "Catering", "amount": 5000},
+        {"item": "Decor", "category": "Decor", "amount": 2000, "status": "Paid"},
+    ])
+    assert len(rows) == 2
+    assert [(r["item_name"], r["status"]) for r in rows] == [("Catering", "Pending"), ("Decor", "Paid")]
+    assert get_budget_summary(user_id) == [{"category": "Catering", "item_count": 1, "total": 5000}]
+
+
+def test_get_user_data_does_not_cache_across_an_update(monkeypatch):
+    user_id = str(uuid.uuid4())
+    db = {"display_name": "OLD"}
+
+    def respond(calls):
+        if not calls:  # the update_user_profile RPC
+            db["display_name"] = "NEW"
+            return [{"user_id": user_id, **db}]
+        row = {"user_id": user_id, **db}
+        if row["display_name"] == "OLD":
+            update_user_data(user_id, {"display_name": "NEW"})  # lands while this read is in flight
+        return row
+
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(respond))
+    assert get_user_data(user_id)["display_name"] == "OLD"
+    assert get_user_data(user_id)["display_name"] == "NEW"
+
+
+def test_vendor_fetch_does_not_cache_across_invalidate(monkeypatch):
+    vendor_id = str(uuid.uuid4())
+
+    def respond(calls):
+        tools.invalidate_vendor(vendor_id)  # vendor edited while the read is in flight
+        return {"vendor_id": vendor_id, "vendor_name": "Old name"}
+
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(respond))
+    assert get_vendor_details(vendor_id)["vendor_name"] == "Old name"
+    assert vendor_id not in tools._vendor_cache
+
+
+def test_get_vendor_details_many_normalises_and_validates_ids(monkeypatch):
+    vendor_id = str(uuid.uuid4())
+    row = {"vendor_id": vendor_id, "vendor_name": "Mandap Co"}
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(lambda calls: [row]))
+    result = get_vendor_details_many([vendor_id.upper(), "bad"])
+    assert result[vendor_id.upper()] == row
+    assert "error" in result["bad"]
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(lambda calls: []))
+    assert get_vendor_details_many([vendor_id]) == {vendor_id: row}  # served from the cache
+
+
+def test_list_vendors_pages_by_rating(monkeypatch):
+    ids = sorted(str(uuid.uuid4()) for _ in range(3))
+    rows = [{"vendor_id": ids[0], "rating": 4.5}, {"vendor_id": ids[1], "rating": 4.5}, {"vendor_id": ids[2], "rating": None}]
+    queries = []
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(lambda calls: queries.append(calls) or rows))
+    filters = {"vendor_category": "Pager"}
+    page = list_vendors(filters, limit=2)
+    assert page == {"data": rows[:2], "next_cursor": f"4.5|{ids[1]}"}
+    assert ("order", ("rating",)) in queries[0] and ("limit", (3,)) in queries[0]
+
+    list_vendors(filters, limit=2, cursor=page["next_cursor"])
+    assert ("or_", (f"rating.lt.4.5,and(rating.eq.4.5,vendor_id.gt.{ids[1]}),rating.is.null",)) in queries[1]
+    list_vendors(filters, limit=2, cursor=f"|{ids[2]}")
+    assert ("is_", ("rating", "null")) in queries[2] and ("gt", ("vendor_id", ids[2])) in queries[2]
+
+    last = list_vendors({"vendor_category": "Pager", "city": "Pune"}, limit=5)
+    assert last["next_cursor"] is None and len(last["data"]) == 3
+    assert "error" in list_vendors(filters, cursor="4.5|vendor_id),or(true")
+
+
+def test_single_flight_shares_one_fetch_between_concurrent_callers():
+    release = threading.Event()
+    calls = []
+
+    def fetch(value):
+        calls.append(value)
+        release.wait(5)
+        return {"value": value}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(tools._single_flight, ("test", 1), fetch, 1) for _ in range(8)]
+        time.sleep(0.2)  # let every caller join the in-flight lookup
+        release.set()
+        results = [f.result() for f in futures]
+    assert calls == [1]
+    assert results == [{"value": 1}] * 8
+    assert ("test", 1) not in tools._inflight
+
+
+def test_single_flight_raises_the_fetch_error_in_every_caller():
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(tools._single_flight, ("test", 2), fetch) for _ in range(4)]
+        time.sleep(0.2)
+        release.set()
+        for f in futures:
+            with pytest.raises(RuntimeError, match="boom"):
+                f.result()
+    assert calls == [1]
+    assert ("test", 2) not in tools._inflight
+
+
+def test_list_vendors_maps_filters_to_columns(monkeypatch):
+    queries = []
+    monkeypatch.setattr(tools, "get_supabase", lambda: _FakeSupabase(lambda calls: queries.append(calls) or []))
+    assert list_vendors({"vendor_name": "Royal", "city": "Pune", "min_rating": 4}) == {"data": [], "next_cursor": None}
+    filters = [args for name, args in queries[0] if name == "filter"]
+    assert sorted(filters) == [("address->>city", "ilike", "%Pune%"), ("rating", "gte", 4), ("vendor_name", "ilike", "%Royal%")]
+
+    result = list_vendors({"vendor_city": "Pune"})
+    assert result == {"error": "Unsupported vendor filter 'vendor_city'. Allowed: vendor_name, vendor_category, description, city, min_rating."}
+    assert len(queries) == 1  # rejected before any request
+
+
+def test_update_user_data_splits_columns_and_preferences(monkeypatch):
+    user_id = str(uuid.uuid4())
+    client = _FakeSupabase(lambda calls: [{"user_id": user_id, "display_name": "Asha"}])
+    monkeypatch.setattr(tools, "get_supabase", lambda: client)
+    data = {"display_name": "Asha", "preferences": {"budget_max": 500000}, "cuisine": "Andhra", "created_at": "x"}
+    assert update_user_data(user_id, data) == {"user_id": user_id, "display_name": "Asha"}
+    assert client.rpcs == [("update_user_profile", {
+        "p_user_id": user_id,
+        "p_columns": {"display_name": "Asha"},
+        "p_preferences": {"budget_max": 500000, "cuisine": "Andhra"},
+    })]
+    assert data["preferences"] == {"budget_max": 500000}  # the caller's dict is left alone
+    assert "error" in update_user_data(user_id, {"created_at": "x"})
+    assert "error" in update_user_data(user_id, {"preferences": "vegan"})
+    assert len(client.rpcs) == 1
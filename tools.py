@@ -1,8 +1,247 @@
 # tools.py - Custom tools for ADK agents to interact with Supabase and Astra DB
 
-from typing import List, Dict, Any, Optional
-from .config import supabase, astra_db # Import configured clients
-import json
+from typing import Iterator, List, Dict, Any, Optional
+from .config import get_supabase, get_astra_db # Shared, lazily created clients
+from .config import BUDGET_CACHE_SIZE, BUDGET_CACHE_TTL, CACHE_ENABLED, SUPABASE_TIMEOUT
+from cachetools import TTLCache
+from concurrent.futures import Future, ThreadPoolExecutor
+from postgrest.exceptions import APIError
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+import copy
+import itertools
+import re
+import threading
+import time
+
+class _LockedTTLCache:
+    """A TTLCache whose operations hold a lock. cachetools caches are not thread-safe (even get()
+    expires entries), and these caches are used from the ADK runner and the _io_executor threads
+    at once. Hold `lock` around read-then-write sequences that must not interleave."""
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self._cache.get(key, default)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self._cache
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self._cache[key] = value
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self._cache.pop(key, default)
+
+    def items(self):
+        with self.lock:
+            return list(self._cache.items())
+
+    def clear(self):
+        with self.lock:
+            self._cache.clear()
+
+
+class _NoCache(dict):
+    """Stands in for a cache when CACHE_ENABLED is off: lookups always miss."""
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.RLock()
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def _ttl_cache(maxsize: int, ttl: float):
+    return _LockedTTLCache(maxsize, ttl) if CACHE_ENABLED else _NoCache()
+
+
+# User lookups: ("users", user_id) -> row and ("user_id", email) -> {"user_id": ...}.
+# Agents re-read the same user on most turns and users change rarely; update_user_data
+# drops the keys it affects.
+_read_cache = _ttl_cache(maxsize=4096, ttl=60)
+# Write tokens for _read_cache keys, used like _budget_generations below. Email lookups
+# share the _EMAIL_LOOKUPS token: the old address of a user whose email changes isn't
+# known up front, and email changes are rare.
+_read_generations = _ttl_cache(maxsize=4096, ttl=2 * SUPABASE_TIMEOUT)
+_EMAIL_LOOKUPS = ("user_id",)
+# Vendor rows by vendor_id, stored as (fetched_at, row). Vendors are maintained outside
+# the agents and change even less often. Rows older than _VENDOR_REFRESH_AFTER seconds
+# are still served, but trigger a background re-read so the next call sees fresh data.
+_vendor_cache = _ttl_cache(maxsize=2048, ttl=300)
+_VENDOR_REFRESH_AFTER = 30
+# Write tokens for the vendor caches, used like _budget_generations below: per vendor_id for
+# details, _ALL_VENDORS for clear_vendor_cache and _VENDOR_LISTS for the list cache.
+_vendor_generations = _ttl_cache(maxsize=2048, ttl=2 * SUPABASE_TIMEOUT)
+_ALL_VENDORS = ("vendors",)
+_VENDOR_LISTS = ("vendor_lists",)
+# list_vendors results keyed by the normalized filters. The same category/city searches
+# recur across users, and a list is fine to be a minute old.
+_vendor_list_cache = _ttl_cache(maxsize=1024, ttl=60)
+# Budget reads, namespaced per user: user_id -> {"items": ..., "summary": ...}. Only the
+# budget tools below write budget_items, and each of them drops the owner's whole entry,
+# so these can live longer.
+_budget_cache = _ttl_cache(maxsize=BUDGET_CACHE_SIZE, ttl=BUDGET_CACHE_TTL)
+# user_id -> token of that user's last budget write. A read captures the token before its
+# request and only caches its result if no write happened meanwhile, so a read that raced
+# a write cannot put the pre-write rows back after the invalidation. Tokens only need to
+# outlive one request.
+_budget_generations = _ttl_cache(maxsize=BUDGET_CACHE_SIZE, ttl=2 * SUPABASE_TIMEOUT)
+_generation_counter = itertools.count(1)
+# (user_id, item_id) pairs an update or delete found no row for. Item ids are generated
+# by the database, so a missing one never appears later; this just stops an agent
+# retrying a bad id from paying a round trip each time.
+_missing_budget_items = _ttl_cache(maxsize=1024, ttl=600)
+
+# Runs independent reads side by side. Each read builds its own request on the
+# shared (thread-safe) HTTP client, so fanned-out calls overlap their round trips.
+_io_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tools-io")
+
+# Lookups currently in progress, keyed like the caches. Concurrent misses for the same
+# key (e.g. fanned-out agents all reading the same user) wait for the first caller's
+# request instead of each sending their own.
+_inflight: Dict[tuple, Future] = {}
+_inflight_lock = threading.Lock()
+# Vendor ids with a background refresh scheduled, also guarded by _inflight_lock.
+_vendor_refreshing = set()
+
+# Profile columns the agents read; auth ids and timestamps are never used.
+USER_COLUMNS = "user_id, email, display_name, wedding_date, wedding_location, wedding_tradition, preferences, user_type"
+# Columns list_vendors returns. Internal fields (owner auth id, commission, verification)
+# and the heavier details / portfolio fields are left to get_vendor_details.
+VENDOR_LIST_COLUMNS = (
+    "vendor_id, vendor_name, vendor_category, contact_email, phone_number, website_url, "
+    "address, pricing_range, rating, description"
+)
+# list_vendors filter keys -> (PostgREST column, operator). Text filters are substring
+# matches (served by the trigram indexes from utils/migrations/006_vendor_trigram_indexes.sql);
+# the city aliases keep older callers working.
+VENDOR_FILTERS = {
+    "vendor_name": ("vendor_name", "ilike"),
+    "vendor_category": ("vendor_category", "ilike"),
+    "description": ("description", "ilike"),
+    "city": ("address->>city", "ilike"),
+    "address->>city": ("address->>city", "ilike"),
+    "address->>'city'": ("address->>city", "ilike"),
+    "min_rating": ("rating", "gte"),
+}
+# Columns the budget agent works with, returned by both reads and writes; the timestamps are never used.
+BUDGET_ITEM_COLUMNS = "item_id, user_id, item_name, category, amount, vendor_name, status"
+# Top-level columns of the users table; any other key given to update_user_data is a preference.
+USERS_TABLE_COLUMNS = frozenset({
+    "user_id", "supabase_auth_uid", "email", "display_name", "created_at", "updated_at",
+    "wedding_date", "wedding_location", "wedding_tradition", "preferences", "user_type"
+})
+# Columns update_user_data may change, matching what update_user_profile() sets
+# (utils/migrations/005_update_user_profile_function.sql).
+UPDATABLE_USER_COLUMNS = frozenset({
+    "email", "display_name", "wedding_date", "wedding_location", "wedding_tradition", "user_type"
+})
+# Columns update_budget_item may change; ids and timestamps are never client-writable.
+UPDATABLE_BUDGET_ITEM_COLUMNS = frozenset({"item_name", "category", "amount", "vendor_name", "status"})
+
+# check_violation / not_null_violation: the row broke a budget_items constraint
+# (see utils/migrations/001_budget_items_constraints.sql).
+_CONSTRAINT_ERROR_CODES = frozenset({"23514", "23502"})
+
+_UUID_RE = re.compile(r"\A[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\Z", re.IGNORECASE)
+
+
+# Postgres compares UUIDs case-insensitively, so the budget cache keys on the lower-cased id.
+def _cached_budget(user_id: str, kind: str) -> Any:
+    with _budget_cache.lock:
+        entry = _budget_cache.get(user_id.lower())
+        return entry.get(kind) if entry is not None else None
+
+
+def _budget_generation(user_id: str) -> Optional[int]:
+    return _budget_generations.get(user_id.lower())
+
+
+def _cache_budget(user_id: str, kind: str, value: Any, generation: Optional[int]) -> None:
+    # Items and summary for the same user can be cached concurrently (get_budget_dashboard),
+    # so creating and filling the per-user entry happens under one lock.
+    user_id = user_id.lower()
+    with _budget_cache.lock:
+        if _budget_generations.get(user_id) != generation:
+            return  # written since this read started; its result may be stale
+        entry = _budget_cache.get(user_id)
+        if entry is None:
+            _budget_cache[user_id] = entry = {}
+        entry[kind] = value
+
+
+def _invalidate_budget(user_id: str) -> None:
+    user_id = user_id.lower()
+    with _budget_cache.lock:
+        _budget_generations[user_id] = next(_generation_counter)
+        _budget_cache.pop(user_id, None)
+
+
+def _cache_read(key: tuple, value: Any, generation_key: tuple, generation: Optional[int]) -> None:
+    with _read_cache.lock:
+        if _read_generations.get(generation_key) == generation:
+            _read_cache[key] = value
+
+
+def _invalidate_read(key: tuple) -> None:
+    with _read_cache.lock:
+        _read_generations[key] = next(_generation_counter)
+        _read_cache.pop(key, None)
+
+
+def _vendor_key(vendor_id: Any) -> Any:
+    # Postgres returns UUIDs lower-cased, so the vendor cache keys on that spelling.
+    return vendor_id.lower() if isinstance(vendor_id, str) else vendor_id
+
+
+def _vendor_generation(vendor_id: Any) -> tuple:
+    return _vendor_generations.get(_ALL_VENDORS), _vendor_generations.get(vendor_id)
+
+
+def _cache_vendor(vendor_id: Any, row: Dict[str, Any], generation: tuple) -> None:
+    with _vendor_cache.lock:
+        if _vendor_generation(vendor_id) == generation:
+            _vendor_cache[vendor_id] = (time.monotonic(), row)
+
+
+def _single_flight(key: tuple, fetch, *args) -> Any:
+    """Runs fetch(*args) once for all concurrent callers with the same key and gives each the result."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = fetch(*args)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+def _valid_uuid(value: Any) -> bool:
+    """True if value is a UUID string, so malformed ids are rejected without a request."""
+    return type(value) is str and _UUID_RE.match(value) is not None
+
+
+def _budget_error(action: str, e: Exception) -> Dict[str, Any]:
+    """Builds the error dict for a failed budget write, naming constraint violations as invalid input."""
+    if isinstance(e, APIError) and e.code in _CONSTRAINT_ERROR_CODES:
+        return {"error": f"Invalid budget item: {e.message}"}
+    return {"error": f"Error {action}: {e}"}
 
 # --- Supabase Tools ---
 
@@ -17,10 +256,21 @@ def get_user_id(email: str) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: A dictionary containing user_id if found, otherwise an error message.
     """
+    # Cached values are shared, so callers always get their own copy.
+    cached = _read_cache.get(("user_id", email))
+    if cached is not None:
+        return copy.deepcopy(cached)
+    return copy.deepcopy(_single_flight(("user_id", email), _fetch_user_id, email))
+
+
+def _fetch_user_id(email: str) -> Dict[str, Any]:
+    generation = _read_generations.get(_EMAIL_LOOKUPS)
     try:
-        response = supabase.table("users").select("user_id").eq("email", email).single().execute()
-        if hasattr(response, "data") and response.data:
-            return response.data
+        response = get_supabase().table("users").select("user_id").eq("email", email).single().execute()
+        result = getattr(response, "data", None)
+        if result:
+            _cache_read(("user_id", email), result, _EMAIL_LOOKUPS, generation)
+            return result
         else:
             return {"error": "User not found."}
     except Exception as e:
@@ -36,10 +286,20 @@ def get_user_data(user_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         Optional[Dict[str, Any]]: A dictionary containing user data if found, otherwise None.  Returns an error message if there's an issue with the database query.
     """
+    cached = _read_cache.get(("users", user_id))
+    if cached is not None:
+        return copy.deepcopy(cached)
+    return copy.deepcopy(_single_flight(("users", user_id), _fetch_user_data, user_id))
+
+
+def _fetch_user_data(user_id: str) -> Optional[Dict[str, Any]]:
+    generation = _read_generations.get(("users", user_id))
     try:
-        response = supabase.table("users").select("*").eq("user_id", user_id).single().execute()
-        if hasattr(response, "data") and response.data:
-            return response.data
+        response = get_supabase().table("users").select(USER_COLUMNS).eq("user_id", user_id).single().execute()
+        result = getattr(response, "data", None)
+        if result:
+            _cache_read(("users", user_id), result, ("users", user_id), generation)
+            return result
         else:
             return None # User not found
     except Exception as e:
@@ -62,35 +322,55 @@ def update_user_data(user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         preferences JSONB DEFAULT '{}',
         user_type TEXT CHECK (user_type IN ('couple', 'vendor', 'guest')) DEFAULT 'couple'
         );"""
-    # List of top-level columns in the users table
-    USERS_TABLE_COLUMNS = {
-        "user_id", "supabase_auth_uid", "email", "display_name", "created_at", "updated_at",
-        "wedding_date", "wedding_location", "wedding_tradition", "preferences", "user_type"
-    }
-    # Separate out fields that are not top-level columns (should go in preferences)
-    preferences_update = data.pop("preferences", None) or {}
-    extra_prefs = {k: data.pop(k) for k in list(data.keys()) if k not in USERS_TABLE_COLUMNS}
-    if extra_prefs:
-        preferences_update.update(extra_prefs)
-    if preferences_update:
-        response = supabase.table("users").select("preferences").eq("user_id", user_id).single().execute()
-        current_prefs = response.data.get("preferences") if response and hasattr(response, "data") else {}
-        if not isinstance(current_prefs, dict):
-            current_prefs = {}
-        current_prefs.update(preferences_update)
-        data["preferences"] = current_prefs
+    # Fields that are not top-level columns go into preferences; the caller's dict is left untouched.
+    preferences = data.get("preferences") or {}
+    if not isinstance(preferences, dict):
+        return {"error": "'preferences' must be an object of preference names to values."}
+    extra_prefs = {k: data[k] for k in data.keys() - USERS_TABLE_COLUMNS}
+    preferences_update = {**preferences, **extra_prefs}
+    columns = {k: data[k] for k in UPDATABLE_USER_COLUMNS & data.keys()}
+    if not columns and not preferences_update:
+        return {"error": f"No updatable fields given. Allowed: {', '.join(sorted(UPDATABLE_USER_COLUMNS))} or preferences."}
     try:
-        response = supabase.table("users").update(data).eq("user_id", user_id).execute()
-        if hasattr(response, "data") and response.data:
-            return response.data[0]
+        # Sets the columns and merges preferences server-side in one statement
+        # (utils/migrations/005_update_user_profile_function.sql), so no pre-read is needed.
+        response = get_supabase().rpc(
+            "update_user_profile",
+            {"p_user_id": user_id, "p_columns": columns, "p_preferences": preferences_update},
+        ).execute()
+        # Bumping the tokens also stops reads already in flight from caching the old row.
+        _invalidate_read(("users", user_id))
+        if "email" in columns:
+            # The old address may still map to this user; changing email is rare, so a scan is fine.
+            with _read_cache.lock:
+                _read_generations[_EMAIL_LOOKUPS] = next(_generation_counter)
+                for key in [k for k, v in _read_cache.items() if k[0] == "user_id" and v.get("user_id") == user_id]:
+                    _read_cache.pop(key, None)
+        rows = getattr(response, "data", None)
+        if rows:
+            return rows[0]
         else:
             return {"error": "Update failed. No data returned."}
     except Exception as e:
         return {"error": f"Error updating user data: {e}"}
 
 
-def list_vendors(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-    """Lists vendors, applying filters if provided."""
+def _parse_vendor_cursor(cursor: Any) -> tuple:
+    """Splits a list_vendors next_cursor ("<rating>|<vendor_id>", rating empty when null) into
+    (rating, vendor_id). Raises ValueError if it is malformed, so nothing unchecked reaches the filter."""
+    rating, _, vendor_id = str(cursor).partition("|")
+    if not _valid_uuid(vendor_id):
+        raise ValueError(cursor)
+    return (float(rating) if rating else None), vendor_id
+
+
+def list_vendors(
+    filters: Optional[Dict[str, Any]] = None, limit: int = 50, cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """Lists vendors, best rated first, applying filters if provided. Returns {"data": [...], "next_cursor": ...}
+    with at most `limit` vendors; next_cursor is null on the last page, otherwise pass it as cursor to get
+    the next page. Supported filters: vendor_name, vendor_category, description, city (partial,
+    case-insensitive matches) and min_rating."""
     """vendors table schema:
     TABLE vendors (
     vendor_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -112,52 +392,189 @@ def list_vendors(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 ); """
-    query = supabase.table("vendors").select("*")
-    if filters:
-        for key, value in filters.items():
-            if key == "address->>'city'":
-                query = query.ilike("address->>city", f"%{value}%")
-            else:
-                query = query.ilike(key, f"%{value}%")
+    # Values end up in the pattern as strings, so stringified filters identify the query.
+    filter_key = tuple(sorted((k, str(v)) for k, v in filters.items())) if filters else ()
+    cache_key = (filter_key, limit, cursor)
+    cached = _vendor_list_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+    for key in filters or ():
+        if key not in VENDOR_FILTERS:
+            return {"error": f"Unsupported vendor filter '{key}'. Allowed: vendor_name, vendor_category, description, city, min_rating."}
+    try:
+        after = _parse_vendor_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        return {"error": "Invalid cursor. Pass the next_cursor of the previous page unchanged."}
+    generation = _vendor_generations.get(_VENDOR_LISTS)
     try:
-        response = query.execute()
-        return response.data or []
+        query = get_supabase().table("vendors").select(VENDOR_LIST_COLUMNS)
+        for key, value in (filters or {}).items():
+            column, op = VENDOR_FILTERS[key]
+            query = query.filter(column, op, f"%{value}%" if op == "ilike" else value)
+        # Keyset pagination on (rating, vendor_id), served by idx_vendor_rating_id
+        # (utils/migrations/008_vendor_rating_index.sql): each page is an index range scan,
+        # however deep it goes. One extra row is fetched to tell whether another page exists.
+        if after is not None:
+            rating, vendor_id = after
+            if rating is None:
+                # Unrated vendors sort last, so only later unrated ones follow.
+                query = query.is_("rating", "null").gt("vendor_id", vendor_id)
+            else:
+                query = query.or_(
+                    f"rating.lt.{rating!r},and(rating.eq.{rating!r},vendor_id.gt.{vendor_id}),rating.is.null"
+                )
+        response = (
+            query.order("rating", desc=True, nullsfirst=False).order("vendor_id").limit(limit + 1).execute()
+        )
+        vendors = response.data or []
+        next_cursor = None
+        if len(vendors) > limit:
+            vendors = vendors[:limit]
+            last = vendors[-1]
+            next_cursor = f"{'' if last['rating'] is None else last['rating']}|{last['vendor_id']}"
+        page = {"data": vendors, "next_cursor": next_cursor}
+        with _vendor_list_cache.lock:
+            if _vendor_generations.get(_VENDOR_LISTS) == generation:
+                _vendor_list_cache[cache_key] = page
+        return copy.deepcopy(page)
     except Exception as e:
         return {"error": f"Error listing vendors: {e}"}
 
 
+def clear_vendor_cache() -> None:
+    """Drops cached vendor lists and details, e.g. after vendors are edited outside the agents."""
+    # Bumping the tokens also stops reads already in flight from caching what they fetched.
+    with _vendor_cache.lock, _vendor_list_cache.lock:
+        _vendor_generations[_ALL_VENDORS] = next(_generation_counter)
+        _vendor_generations[_VENDOR_LISTS] = next(_generation_counter)
+        _vendor_list_cache.clear()
+        _vendor_cache.clear()
+
+
+def invalidate_vendor(vendor_id: str) -> None:
+    """Drops one vendor's cached details, and the cached lists that may include it."""
+    vendor_id = _vendor_key(vendor_id)
+    with _vendor_cache.lock, _vendor_list_cache.lock:
+        _vendor_generations[vendor_id] = next(_generation_counter)
+        _vendor_generations[_VENDOR_LISTS] = next(_generation_counter)
+        _vendor_cache.pop(vendor_id, None)
+        _vendor_list_cache.clear()
+
 
 def get_vendor_details(vendor_id: str) -> Optional[Dict[str, Any]]:
     """Retrieves vendor details by vendor_id."""
-    """vendors table schema:
-    TABLE vendors (
-    vendor_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    vendor_name VARCHAR(255) NOT NULL,
-    vendor_category VARCHAR(100) NOT NULL, -- 'Venue', 'Photographer', etc.
-    contact_email VARCHAR(255),
-    phone_number VARCHAR(50),
-    website_url TEXT,
-    address JSONB, -- {"full_address": "", "city": "", ...}
-    pricing_range JSONB, -- {"min": 5000, "max": 15000, ...}
-    rating FLOAT CHECK (rating >= 0 AND rating <= 5),
-    description TEXT,
-    details JSONB, -- Additional details 
-    portfolio_image_urls TEXT[], -- URLs to Supabase Storage
-    is_active BOOLEAN DEFAULT true,
-    supabase_auth_uid UUID UNIQUE NULL REFERENCES auth.users(id), -- Supabase Auth ID of primary vendor owner/admin
-    is_verified BOOLEAN DEFAULT false, -- For platform admins to verify vendors
-    commission_rate DECIMAL(5,2) DEFAULT 0.05, -- Platform's commission rate for this vendor
-    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-);"""
+    vendor_id = _vendor_key(vendor_id)
+    cached = _vendor_cache.get(vendor_id)
+    if cached is not None:
+        fetched_at, row = cached
+        if time.monotonic() - fetched_at > _VENDOR_REFRESH_AFTER:
+            # Stale-while-revalidate: only the first caller to see the stale row schedules the
+            # refresh. The entry keeps its stamp, so it still expires on the cache's own TTL.
+            with _inflight_lock:
+                schedule = vendor_id not in _vendor_refreshing
+                _vendor_refreshing.add(vendor_id)
+            if schedule:
+                _io_executor.submit(_refresh_vendor, vendor_id)
+        return copy.deepcopy(row)
+    return copy.deepcopy(_single_flight(("vendors", vendor_id), _fetch_vendor_details, vendor_id))
+
+
+def _refresh_vendor(vendor_id: str) -> None:
     try:
-        response = supabase.table("vendors").select("*").eq("vendor_id", vendor_id).single().execute()
-        if hasattr(response, "data") and response.data:
-            return response.data
+        _single_flight(("vendors", vendor_id), _fetch_vendor_details, vendor_id)
+    finally:
+        with _inflight_lock:
+            _vendor_refreshing.discard(vendor_id)
+
+
+def _fetch_vendor_details(vendor_id: str) -> Optional[Dict[str, Any]]:
+    generation = _vendor_generation(vendor_id)
+    try:
+        response = get_supabase().table("vendors").select("*").eq("vendor_id", vendor_id).single().execute()
+        result = getattr(response, "data", None)
+        if result:
+            _cache_vendor(vendor_id, result, generation)
+            return result
         else:
+            _vendor_cache.pop(vendor_id, None)  # don't keep serving a vendor that is gone
             return None # Vendor not found
+    except Exception as e:
+        # .single() raises when the row is gone; either way the cached row can't be confirmed.
+        _vendor_cache.pop(vendor_id, None)
+        return {"error": f"Error fetching vendor details: {e}"}
+
+
+def get_vendor_details_many(vendor_ids: List[str]) -> Dict[str, Any]:
+    """Retrieves details for several vendors, keyed by vendor_id. Unknown ids are left out; invalid ones map to an error."""
+    # Cached vendors are served from the cache; the rest are fetched together with one
+    # vendor_id IN (...) query and cached individually.
+    result: Dict[str, Any] = {}
+    missing: Dict[str, List[str]] = {}  # lower-cased id -> the caller's spellings of it
+    generations = {}
+    for vendor_id in dict.fromkeys(vendor_ids):
+        if not _valid_uuid(vendor_id):
+            result[vendor_id] = {"error": "Invalid vendor_id."}
+            continue
+        key = _vendor_key(vendor_id)
+        cached = _vendor_cache.get(key)
+        if cached is not None:
+            result[vendor_id] = cached[1]
+            continue
+        if key not in missing:
+            generations[key] = _vendor_generation(key)
+        missing.setdefault(key, []).append(vendor_id)
+    if not missing:
+        return copy.deepcopy(result)
+    try:
+        response = get_supabase().table("vendors").select("*").in_("vendor_id", list(missing)).execute()
     except Exception as e:
         return {"error": f"Error fetching vendor details: {e}"}
+    for row in getattr(response, "data", None) or []:
+        key = _vendor_key(row["vendor_id"])
+        _cache_vendor(key, row, generations[key])
+        for vendor_id in missing[key]:
+            result[vendor_id] = row
+    return copy.deepcopy(result)
+
+
+@dataclass(frozen=True, slots=True)
+class BudgetItemInput:
+    """A budget_items row to insert, checked in one pass before any request is sent."""
+    user_id: str
+    item_name: str
+    category: str
+    amount: float
+    vendor_name: Optional[str] = None
+    status: str = "Pending"
+
+    def __post_init__(self):
+        item_name, category, status = self.item_name, self.category, self.status
+        if not _valid_uuid(self.user_id):
+            raise ValueError("'user_id' must be a UUID.")
+        if not (
+            type(item_name) is str and type(category) is str and type(status) is str
+            and item_name and category and status
+        ):
+            # Error path only: work out which field to report, by the key the caller passed it as.
+            field = next(f for f in ("item_name", "category", "status")
+                         if not (type(getattr(self, f)) is str and getattr(self, f)))
+            key = "item" if field == "item_name" else field
+            raise ValueError(f"'{key}' must be a non-empty string.")
+        # Range checks (amount >= 0, non-blank names) are enforced by the table's CHECK constraints.
+        try:
+            object.__setattr__(self, "amount", float(self.amount))
+        except (TypeError, ValueError):
+            raise ValueError("'amount' must be a number.") from None
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "item_name": self.item_name,
+            "category": self.category,
+            "amount": self.amount,
+            "vendor_name": self.vendor_name,
+            "status": self.status
+        }
 
 
 def add_budget_item(user_id: str, item: Dict[str, Any], vendor_name: Optional[str] = None, status: str = "Pending") -> Dict[str, Any]:
@@ -174,106 +591,286 @@ def add_budget_item(user_id: str, item: Dict[str, Any], vendor_name: Optional[st
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );"""
-    data = {
-        "user_id": user_id,
-        "item_name": item.get("item"),
-        "category": item.get("category"),
-        "amount": item.get("amount"),
-        "vendor_name": vendor_name,
-        "status": status
-    }
     try:
-        response = supabase.table("budget_items").insert(data).execute()
-        if hasattr(response, "data") and response.data:
-            return response.data[0]
+        data = BudgetItemInput(user_id, item.get("item"), item.get("category"), item.get("amount"), vendor_name, status).to_row()
+    except ValueError as e:
+        return {"error": f"Invalid budget item: {e}"}
+    try:
+        response = get_supabase().table("budget_items").insert(data).select(BUDGET_ITEM_COLUMNS).execute()
+        _invalidate_budget(user_id)
+        rows = getattr(response, "data", None)
+        if rows:
+            return rows[0]
         else:
             return {"error": "Adding budget item failed. No data returned."}
     except Exception as e:
-        return {"error": f"Error adding budget item: {e}"}
+        return _budget_error("adding budget item", e)
+
+
+def add_budget_items_bulk(user_id: str, items: List[Dict[str, Any]], status: str = "Pending") -> List[Dict[str, Any]]:
+    """Adds several budget items for a user. Each item has "item", "category", "amount" and optionally
+    "vendor_name" and "status" (defaulting to the status argument). Returns the inserted rows."""
+    # All rows are validated up front and sent in a single insert request.
+    try:
+        data = [
+            BudgetItemInput(
+                user_id, item.get("item"), item.get("category"), item.get("amount"),
+                item.get("vendor_name"), item.get("status", status)
+            ).to_row()
+            for item in items
+        ]
+    except ValueError as e:
+        return {"error": f"Invalid budget item: {e}"}
+    if not data:
+        return []
+    try:
+        response = get_supabase().table("budget_items").insert(data).select(BUDGET_ITEM_COLUMNS).execute()
+        _invalidate_budget(user_id)
+        rows = getattr(response, "data", None)
+        if rows:
+            return rows
+        else:
+            return {"error": "Adding budget items failed. No data returned."}
+    except Exception as e:
+        return _budget_error("adding budget items", e)
 
 
 def get_budget_items(user_id: str) -> List[Dict[str, Any]]:
     """Retrieves all budget items for a user."""
-    """budget_items table schema:
-    TABLE budget_items (
-    item_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
-    item_name TEXT NOT NULL,
-    category VARCHAR(100) NOT NULL,
-    amount DECIMAL(12, 2) NOT NULL,
-    vendor_name TEXT,
-    status VARCHAR(50) DEFAULT 'Pending',
-    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-);"""
+    if not _valid_uuid(user_id):
+        return {"error": "Invalid user_id."}
+    cached = _cached_budget(user_id, "items")
+    if cached is not None:
+        return copy.deepcopy(cached)
+    generation = _budget_generation(user_id)
     try:
-        response = supabase.table("budget_items").select("*").eq("user_id", user_id).execute()
-        return response.data or []
+        response = get_supabase().table("budget_items").select(BUDGET_ITEM_COLUMNS).eq("user_id", user_id).execute()
+        items = getattr(response, "data", None) or []
+        _cache_budget(user_id, "items", items, generation)
+        return copy.deepcopy(items)
     except Exception as e:
         return {"error": f"Error getting budget items: {e}"}
 
 
-def update_budget_item(item_id: str, **kwargs) -> Dict[str, Any]:
-    """Updates a budget item."""
-    """TABLE budget_items (
-    item_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
-    item_name TEXT NOT NULL,
-    category VARCHAR(100) NOT NULL,
-    amount DECIMAL(12, 2) NOT NULL,
-    vendor_name TEXT,
-    status VARCHAR(50) DEFAULT 'Pending',
-    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-);"""
+def get_budget_items_many(user_ids: List[str]) -> Dict[str, Any]:
+    """Retrieves budget items for several users, keyed by user_id. Invalid user_ids map to an error."""
+    # Cached users are served from the cache; the rest are fetched together with one
+    # user_id IN (...) query and cached individually.
+    result: Dict[str, Any] = {}
+    missing: Dict[str, List[str]] = {}  # lower-cased id -> the caller's spellings of it
+    generations = {}
+    for user_id in dict.fromkeys(user_ids):
+        if not _valid_uuid(user_id):
+            result[user_id] = {"error": "Invalid user_id."}
+            continue
+        cached = _cached_budget(user_id, "items")
+        if cached is not None:
+            result[user_id] = cached
+            continue
+        key = user_id.lower()
+        if key not in missing:
+            generations[key] = _budget_generation(key)
+        missing.setdefault(key, []).append(user_id)
+    if not missing:
+        return copy.deepcopy(result)
+    try:
+        response = get_supabase().table("budget_items").select(BUDGET_ITEM_COLUMNS).in_("user_id", list(missing)).execute()
+    except Exception as e:
+        return {"error": f"Error getting budget items: {e}"}
+    grouped: Dict[str, List[Dict[str, Any]]] = {key: [] for key in missing}
+    for row in getattr(response, "data", None) or []:
+        grouped[row["user_id"].lower()].append(row)
+    for key, items in grouped.items():
+        _cache_budget(key, "items", items, generations[key])
+        for user_id in missing[key]:
+            result[user_id] = items
+    return copy.deepcopy(result)
+
+
+def _round_cents(value: Decimal) -> float:
+    # SQL's ROUND on numeric rounds halves away from zero; Python's round() on floats does not.
+    return float(value.quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+
+def _summarize_budget_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Builds get_budget_summary's rows from a user's item list, matching the SQL function's output."""
+    per_category: Dict[str, List[Any]] = {}
+    budget_total = budget_paid = Decimal(0)
+    for item in items:
+        amount = Decimal(str(item["amount"]))  # amounts are DECIMAL(12, 2), so sum them exactly
+        stats = per_category.setdefault(item["category"], [0, Decimal(0), Decimal(0)])
+        stats[0] += 1
+        stats[1] += amount
+        budget_total += amount
+        if item["status"] == "Paid":
+            stats[2] += amount
+            budget_paid += amount
+    return [
+        {
+            "category": category,
+            "item_count": count,
+            "total": _round_cents(total),
+            "total_paid": _round_cents(paid),
+            "percentage_of_budget": _round_cents(100 * total / budget_total) if budget_total else None,
+            "budget_total": _round_cents(budget_total),
+            "budget_paid": _round_cents(budget_paid),
+        }
+        # Codepoint order, as the SQL function's ORDER BY category COLLATE "C".
+        for category, (count, total, paid) in sorted(per_category.items())
+    ]
+
+
+def get_budget_summary(user_id: str) -> List[Dict[str, Any]]:
+    """Retrieves per-category item counts and totals of a user's budget, plus overall budget totals.
+    Each row is {"category", "item_count", "total", "total_paid", "percentage_of_budget", "budget_total",
+    "budget_paid"}; the budget_* fields are the same on every row and percentage_of_budget is null for an
+    all-zero budget."""
+    # Computed by the get_budget_summary SQL function (utils/migrations/007_budget_summary_codepoint_order.sql)
+    # in one query, or locally from the cached item list when there is one.
+    if not _valid_uuid(user_id):
+        return {"error": "Invalid user_id."}
+    cached = _cached_budget(user_id, "summary")
+    if cached is not None:
+        return copy.deepcopy(cached)
+    generation = _budget_generation(user_id)
+    items = _cached_budget(user_id, "items")
+    if items is not None:
+        # The item list is already here, so aggregating it locally saves the round trip.
+        summary = _summarize_budget_items(items)
+        _cache_budget(user_id, "summary", summary, generation)
+        return copy.deepcopy(summary)
+    try:
+        response = get_supabase().rpc("get_budget_summary", {"p_user_id": user_id}).execute()
+        summary = getattr(response, "data", None) or []
+        _cache_budget(user_id, "summary", summary, generation)
+        return copy.deepcopy(summary)
+    except Exception as e:
+        return {"error": f"Error getting budget summary: {e}"}
+
+
+def get_budget_overview(user_id: str) -> Dict[str, Any]:
+    """Retrieves a user's profile (including budget preferences) and budget items in one call."""
+    # The two reads are independent, so they run side by side on the I/O pool.
+    user_future = _io_executor.submit(get_user_data, user_id)
+    items_future = _io_executor.submit(get_budget_items, user_id)
+    return {"user": user_future.result(), "budget_items": items_future.result()}
+
+
+def get_budget_dashboard(user_id: str) -> Dict[str, Any]:
+    """Retrieves a user's budget summary and full item list in one call. Either part may be an error."""
+    # Both reads run side by side on the I/O pool.
+    summary_future = _io_executor.submit(get_budget_summary, user_id)
+    items_future = _io_executor.submit(get_budget_items, user_id)
+    return {"summary": summary_future.result(), "budget_items": items_future.result()}
+
+
+def iter_budget_items(user_id: str, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+    """Yields a user's budget items page by page. Unlike the agent tools, query errors are raised."""
+    # Keyset pagination on item_id: each page is an index range scan, however deep it goes.
+    last_item_id = None
+    while True:
+        query = get_supabase().table("budget_items").select(BUDGET_ITEM_COLUMNS).eq("user_id", user_id)
+        if last_item_id is not None:
+            query = query.gt("item_id", last_item_id)
+        response = query.order("item_id").limit(page_size).execute()
+        rows = getattr(response, "data", None) or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_item_id = rows[-1]["item_id"]
+
+
+def _budget_item_updates(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the subset of fields that may be written to an existing budget item."""
+    return {k: fields[k] for k in UPDATABLE_BUDGET_ITEM_COLUMNS & fields.keys()}
+
+
+def update_budget_item(user_id: str, item_id: str, **kwargs) -> Dict[str, Any]:
+    """Updates a budget item owned by the given user. Accepts item_name, category, amount, vendor_name and status."""
+    updates = _budget_item_updates(kwargs)
+    if not updates:
+        return {"error": f"No updatable fields given. Allowed: {', '.join(sorted(UPDATABLE_BUDGET_ITEM_COLUMNS))}."}
+    if not (_valid_uuid(user_id) and _valid_uuid(item_id)):
+        return {"error": "Invalid user_id or item_id."}
+    if (user_id, item_id) in _missing_budget_items:
+        return {"error": "Updating budget item failed. No data returned."}
     try:
-        response = supabase.table("budget_items").update(kwargs).eq("item_id", item_id).execute()
-        if hasattr(response, "data") and response.data:
-            return response.data[0]
+        # Filtering on user_id as well enforces ownership in the same request.
+        response = (
+            get_supabase().table("budget_items").update(updates)
+            .eq("item_id", item_id).eq("user_id", user_id)
+            .select(BUDGET_ITEM_COLUMNS)
+            .execute()
+        )
+        rows = getattr(response, "data", None)
+        if rows:
+            _invalidate_budget(user_id)
+            return rows[0]
         else:
+            _missing_budget_items[(user_id, item_id)] = True
             return {"error": "Updating budget item failed. No data returned."}
     except Exception as e:
-        return {"error": f"Error updating budget item: {e}"}
-
-
-def delete_budget_item(item_id: str) -> Dict[str, Any]:
-    """Deletes a budget item."""
-    """budget_items table schema:
-    TABLE budget_items (
-    item_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
-    item_name TEXT NOT NULL,
-    category VARCHAR(100) NOT NULL,
-    amount DECIMAL(12, 2) NOT NULL,
-    vendor_name TEXT,
-    status VARCHAR(50) DEFAULT 'Pending',
-    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-);"""
+        return _budget_error("updating budget item", e)
+
+
+def update_budget_items(user_id: str, item_updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Updates several budget items owned by the given user. Each entry holds an item_id plus the fields
+    to change, as for update_budget_item. Returns one result per entry, in order: the updated row or an error."""
+    # The updates run side by side on the I/O pool.
+    futures = []
+    for entry in item_updates:
+        item_id = entry.get("item_id")
+        if not item_id:
+            futures.append(None)
+            continue
+        futures.append(_io_executor.submit(update_budget_item, user_id, item_id, **_budget_item_updates(entry)))
+    return [f.result() if f is not None else {"error": "Missing item_id."} for f in futures]
+
+def delete_budget_item(user_id: str, item_id: str) -> Dict[str, Any]:
+    """Deletes a budget item owned by the given user."""
+    if not (_valid_uuid(user_id) and _valid_uuid(item_id)):
+        return {"error": "Invalid user_id or item_id."}
+    if (user_id, item_id) in _missing_budget_items:
+        return {"error": "Deletion failed."}
     try:
-        response = supabase.table("budget_items").delete().eq("item_id", item_id).execute()
-        return {"status": "success"} if hasattr(response, "data") and response.data else {"error": "Deletion failed."}
+        # Filtering on user_id as well enforces ownership in the same request.
+        response = (
+            get_supabase().table("budget_items").delete()
+            .eq("item_id", item_id).eq("user_id", user_id)
+            .select("item_id")  # only needed to tell whether a row matched
+            .execute()
+        )
+        rows = getattr(response, "data", None)
+        if rows:
+            _invalidate_budget(user_id)
+            return {"status": "success"}
+        _missing_budget_items[(user_id, item_id)] = True
+        return {"error": "Deletion failed."}
     except Exception as e:
         return {"error": f"Error deleting budget item: {e}"}
 
 
 # --- Astra DB Tools ---
 
+@lru_cache(maxsize=None)
+def _ritual_collection():
+    """Returns the 'ritual_data' collection handle, resolved once and reused."""
+    return get_astra_db().get_collection("ritual_data")
+
+
 def search_rituals(question: str) -> List[Dict[str, Any]]:
     """
     Searches for rituals in Astra DB using vector search.  Returns top 3 most relevant documents.  Handles CollectionExceptions.
     """
     """ input: question - a string containing the user's query about rituals"""
     try:
-        ritual_data = astra_db.get_collection("ritual_data")
-        result = ritual_data.find(
+        # The limit is sent to Astra, so the cursor only ever holds the top 3 documents.
+        result = _ritual_collection().find(
             projection={"$vectorize": True},
             sort={"$vectorize": question},
             limit=3
-            
         )
-        contexts = [doc for doc in result]
-        return contexts
+        return list(result)
     except Exception as e:
         return {"error": f"An unexpected error occurred during ritual search: {e}"}
 
@@ -322,10 +919,10 @@ if __name__ == "__main__":
     # print(get_budget_items(test_user_id))
 
     # print("\nTesting update_budget_item...")
-    # print(update_budget_item(test_budget_item_id, amount=1500))
+    # print(update_budget_item(test_user_id, test_budget_item_id, amount=1500))
 
     # print("\nTesting delete_budget_item...")
-    # print(delete_budget_item(test_budget_item_id))
+    # print(delete_budget_item(test_user_id, test_budget_item_id))
 
     # print("\nTesting search_rituals...")
     # print(search_rituals(test_question))
@@ -0,0 +1,10 @@
+-- Budget item invariants enforced by the database, so the budget tools can
+-- insert/update in a single round trip without re-checking them in Python.
+-- Each constraint is dropped first so the migration can be re-run safely.
+ALTER TABLE budget_items
+    DROP CONSTRAINT IF EXISTS budget_items_amount_nonneg,
+    DROP CONSTRAINT IF EXISTS budget_items_item_name_not_blank,
+    DROP CONSTRAINT IF EXISTS budget_items_category_not_blank,
+    ADD CONSTRAINT budget_items_amount_nonneg CHECK (amount >= 0),
+    ADD CONSTRAINT budget_items_item_name_not_blank CHECK (btrim(item_name) <> ''),
+    ADD CONSTRAINT budget_items_category_not_blank CHECK (btrim(category) <> '');
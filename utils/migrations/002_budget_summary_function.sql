@@ -0,0 +1,12 @@
+-- Per-category budget totals computed in Postgres, so get_budget_summary ships
+-- one row per category instead of every budget item. Called via PostgREST RPC.
+CREATE OR REPLACE FUNCTION get_budget_summary(p_user_id UUID)
+RETURNS TABLE (category VARCHAR(100), item_count BIGINT, total DECIMAL(12, 2))
+LANGUAGE sql STABLE
+AS $$
+    SELECT b.category, COUNT(*), SUM(b.amount)
+    FROM budget_items b
+    WHERE b.user_id = p_user_id
+    GROUP BY b.category
+    ORDER BY b.category;
+$$;
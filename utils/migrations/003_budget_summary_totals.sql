@@ -0,0 +1,26 @@
+-- Adds paid amounts and whole-budget totals to get_budget_summary. The overall
+-- figures are window aggregates over the grouped rows, so the per-category
+-- breakdown and the budget status come back from a single call.
+DROP FUNCTION IF EXISTS get_budget_summary(UUID);
+CREATE FUNCTION get_budget_summary(p_user_id UUID)
+RETURNS TABLE (
+    category VARCHAR(100),
+    item_count BIGINT,
+    total DECIMAL(12, 2),
+    total_paid DECIMAL(12, 2),
+    budget_total DECIMAL(12, 2),
+    budget_paid DECIMAL(12, 2)
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT b.category,
+           COUNT(*),
+           SUM(b.amount),
+           COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0),
+           SUM(SUM(b.amount)) OVER (),
+           SUM(COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0)) OVER ()
+    FROM budget_items b
+    WHERE b.user_id = p_user_id
+    GROUP BY b.category
+    ORDER BY b.category;
+$$;
@@ -0,0 +1,27 @@
+-- Adds each category's share of the whole budget to get_budget_summary, computed
+-- in the query so callers get the final figures without any client-side maths.
+DROP FUNCTION IF EXISTS get_budget_summary(UUID);
+CREATE FUNCTION get_budget_summary(p_user_id UUID)
+RETURNS TABLE (
+    category VARCHAR(100),
+    item_count BIGINT,
+    total DECIMAL(12, 2),
+    total_paid DECIMAL(12, 2),
+    percentage_of_budget DECIMAL(5, 2),
+    budget_total DECIMAL(12, 2),
+    budget_paid DECIMAL(12, 2)
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT b.category,
+           COUNT(*),
+           SUM(b.amount),
+           COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0),
+           ROUND(100.0 * SUM(b.amount) / NULLIF(SUM(SUM(b.amount)) OVER (), 0), 2),
+           SUM(SUM(b.amount)) OVER (),
+           SUM(COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0)) OVER ()
+    FROM budget_items b
+    WHERE b.user_id = p_user_id
+    GROUP BY b.category
+    ORDER BY b.category;
+$$;
@@ -0,0 +1,25 @@
+-- Updates a user's profile columns and merges into preferences in one statement,
+-- so update_user_data needs no read of the current preferences first and two
+-- concurrent preference updates cannot overwrite each other. Called via PostgREST RPC.
+-- p_columns holds the profile columns to set (keys that are absent keep their value);
+-- p_preferences is merged key by key into the existing preferences object.
+CREATE OR REPLACE FUNCTION update_user_profile(p_user_id UUID, p_columns JSONB, p_preferences JSONB)
+RETURNS SETOF users
+LANGUAGE sql VOLATILE
+AS $$
+    UPDATE users u
+    SET email = CASE WHEN p_columns ? 'email' THEN r.email ELSE u.email END,
+        display_name = CASE WHEN p_columns ? 'display_name' THEN r.display_name ELSE u.display_name END,
+        wedding_date = CASE WHEN p_columns ? 'wedding_date' THEN r.wedding_date ELSE u.wedding_date END,
+        wedding_location = CASE WHEN p_columns ? 'wedding_location' THEN r.wedding_location ELSE u.wedding_location END,
+        wedding_tradition = CASE WHEN p_columns ? 'wedding_tradition' THEN r.wedding_tradition ELSE u.wedding_tradition END,
+        user_type = CASE WHEN p_columns ? 'user_type' THEN r.user_type ELSE u.user_type END,
+        preferences = CASE
+            WHEN p_preferences = '{}'::jsonb THEN u.preferences
+            WHEN jsonb_typeof(u.preferences) = 'object' THEN u.preferences || p_preferences
+            ELSE p_preferences
+        END
+    FROM jsonb_populate_record(NULL::users, p_columns) r
+    WHERE u.user_id = p_user_id
+    RETURNING u.*;
+$$;
@@ -0,0 +1,8 @@
+-- list_vendors filters with ILIKE '%value%', which a b-tree index cannot serve.
+-- Trigram GIN indexes let Postgres answer those filters without scanning vendors.
+-- idx_vendor_city (a btree_gin index) only serves equality and range comparisons,
+-- not ILIKE '%...%', so it is replaced by a trigram index on the same expression.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+DROP INDEX IF EXISTS idx_vendor_city;
+CREATE INDEX IF NOT EXISTS idx_vendor_city_trgm ON vendors USING gin ((address ->> 'city') gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_vendor_category_trgm ON vendors USING gin (vendor_category gin_trgm_ops);
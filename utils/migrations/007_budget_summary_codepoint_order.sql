@@ -0,0 +1,27 @@
+-- Orders get_budget_summary's categories by codepoint ("C" collation) rather than the
+-- database's locale collation, so the rows come back in the same order as the summary
+-- get_budget_summary builds in Python from cached items (sorted() on str).
+CREATE OR REPLACE FUNCTION get_budget_summary(p_user_id UUID)
+RETURNS TABLE (
+    category VARCHAR(100),
+    item_count BIGINT,
+    total DECIMAL(12, 2),
+    total_paid DECIMAL(12, 2),
+    percentage_of_budget DECIMAL(5, 2),
+    budget_total DECIMAL(12, 2),
+    budget_paid DECIMAL(12, 2)
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT b.category,
+           COUNT(*),
+           SUM(b.amount),
+           COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0),
+           ROUND(100.0 * SUM(b.amount) / NULLIF(SUM(SUM(b.amount)) OVER (), 0), 2),
+           SUM(SUM(b.amount)) OVER (),
+           SUM(COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0)) OVER ()
+    FROM budget_items b
+    WHERE b.user_id = p_user_id
+    GROUP BY b.category
+    ORDER BY b.category COLLATE "C";
+$$;
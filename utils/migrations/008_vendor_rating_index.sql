@@ -0,0 +1,4 @@
+-- list_vendors returns the best rated vendors first and pages with a keyset on
+-- (rating, vendor_id). This index matches that order, so each page is a range
+-- scan that stops after `limit` rows instead of a sort of every match.
+CREATE INDEX IF NOT EXISTS idx_vendor_rating_id ON vendors (rating DESC NULLS LAST, vendor_id);
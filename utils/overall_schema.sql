@@ -38,6 +38,29 @@ BEFORE UPDATE ON users
 FOR EACH ROW
 EXECUTE FUNCTION trigger_set_timestamp();
 
+-- Profile update with a preferences merge in one statement, used by update_user_data
+-- (from migrations/005_update_user_profile_function.sql)
+CREATE OR REPLACE FUNCTION update_user_profile(p_user_id UUID, p_columns JSONB, p_preferences JSONB)
+RETURNS SETOF users
+LANGUAGE sql VOLATILE
+AS $$
+    UPDATE users u
+    SET email = CASE WHEN p_columns ? 'email' THEN r.email ELSE u.email END,
+        display_name = CASE WHEN p_columns ? 'display_name' THEN r.display_name ELSE u.display_name END,
+        wedding_date = CASE WHEN p_columns ? 'wedding_date' THEN r.wedding_date ELSE u.wedding_date END,
+        wedding_location = CASE WHEN p_columns ? 'wedding_location' THEN r.wedding_location ELSE u.wedding_location END,
+        wedding_tradition = CASE WHEN p_columns ? 'wedding_tradition' THEN r.wedding_tradition ELSE u.wedding_tradition END,
+        user_type = CASE WHEN p_columns ? 'user_type' THEN r.user_type ELSE u.user_type END,
+        preferences = CASE
+            WHEN p_preferences = '{}'::jsonb THEN u.preferences
+            WHEN jsonb_typeof(u.preferences) = 'object' THEN u.preferences || p_preferences
+            ELSE p_preferences
+        END
+    FROM jsonb_populate_record(NULL::users, p_columns) r
+    WHERE u.user_id = p_user_id
+    RETURNING u.*;
+$$;
+
 -- Vendors Table (Global Vendor Directory - EDITED)
 CREATE TABLE vendors (
     vendor_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -60,8 +83,10 @@ CREATE TABLE vendors (
     updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 CREATE INDEX idx_vendor_category ON vendors (vendor_category);
-CREATE INDEX idx_vendor_city ON vendors USING gin ((address ->> 'city'));
+CREATE INDEX idx_vendor_category_trgm ON vendors USING gin (vendor_category gin_trgm_ops);
+CREATE INDEX idx_vendor_city_trgm ON vendors USING gin ((address ->> 'city') gin_trgm_ops);
 CREATE INDEX idx_gin_vendor_name_trgm ON vendors USING gin (vendor_name gin_trgm_ops);
+CREATE INDEX idx_vendor_rating_id ON vendors (rating DESC NULLS LAST, vendor_id); -- list_vendors order and keyset
 CREATE INDEX idx_vendors_supabase_auth_uid ON vendors (supabase_auth_uid) WHERE supabase_auth_uid IS NOT NULL; -- Index on the auth uid
 
 CREATE TRIGGER set_vendors_updated_at
@@ -168,7 +193,7 @@ CREATE TABLE mood_board_items (
 CREATE INDEX idx_mood_board_item_board_id ON mood_board_items (mood_board_id);
 -- No updated_at for mood_board_items typically, but add if needed
 
--- Budget Items Table (NO CHANGE)
+-- Budget Items Table (constraints added in migrations/001_budget_items_constraints.sql)
 CREATE TABLE budget_items (
     item_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
@@ -178,7 +203,10 @@ CREATE TABLE budget_items (
     vendor_name TEXT,
     status VARCHAR(50) DEFAULT 'Pending',
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT budget_items_amount_nonneg CHECK (amount >= 0),
+    CONSTRAINT budget_items_item_name_not_blank CHECK (btrim(item_name) <> ''),
+    CONSTRAINT budget_items_category_not_blank CHECK (btrim(category) <> '')
 );
 CREATE INDEX idx_budget_item_user_id ON budget_items (user_id);
 
@@ -187,6 +215,33 @@ BEFORE UPDATE ON budget_items
 FOR EACH ROW
 EXECUTE FUNCTION trigger_set_timestamp();
 
+-- Per-category budget summary with overall totals, used by get_budget_summary
+-- (from migrations/002-004 and 007)
+CREATE OR REPLACE FUNCTION get_budget_summary(p_user_id UUID)
+RETURNS TABLE (
+    category VARCHAR(100),
+    item_count BIGINT,
+    total DECIMAL(12, 2),
+    total_paid DECIMAL(12, 2),
+    percentage_of_budget DECIMAL(5, 2),
+    budget_total DECIMAL(12, 2),
+    budget_paid DECIMAL(12, 2)
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT b.category,
+           COUNT(*),
+           SUM(b.amount),
+           COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0),
+           ROUND(100.0 * SUM(b.amount) / NULLIF(SUM(SUM(b.amount)) OVER (), 0), 2),
+           SUM(SUM(b.amount)) OVER (),
+           SUM(COALESCE(SUM(b.amount) FILTER (WHERE b.status = 'Paid'), 0)) OVER ()
+    FROM budget_items b
+    WHERE b.user_id = p_user_id
+    GROUP BY b.category
+    ORDER BY b.category COLLATE "C";
+$$;
+
 -- Guest List Table (NO CHANGE)
 CREATE TABLE guest_list (
     guest_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -1,6 +1,4 @@
-from config import supabase
-from astrapy import DataAPIClient
-import os
+from config import supabase, astra_db
 
 # Test Supabase connection
 try:
@@ -11,12 +9,8 @@ except Exception as e:
 
 # Test Astra DB connection using ritual vector search
 try:
-    # Inline get_rituals_astra logic for test
-    ASTRA_API_TOKEN = os.environ.get("ASTRA_API_TOKEN")
-    ASTRA_API_ENDPOINT = os.environ.get("ASTRA_API_ENDPOINT")
-    client = DataAPIClient(ASTRA_API_TOKEN)
-    db = client.get_database_by_api_endpoint(ASTRA_API_ENDPOINT)
-    ritual_data = db.get_collection("ritual_data")
+    # Inline get_rituals_astra logic for test, using the shared handle from config.py
+    ritual_data = astra_db.get_collection("ritual_data")
     question = "Describe the Haldi ceremony"
     result = ritual_data.find(
         projection={"$vectorize": True},